@@ -1,22 +1,91 @@
 import os
+import codecs
+import importlib.util
+import numpy as np
 import pandas as pd
 import re
 import logging
+import atexit
 import time
 import json
-from typing import List, Dict, Any, Optional
+from logging.handlers import MemoryHandler
+from typing import List, Dict, Any, Optional, Tuple
 
 # --- Configuration & Setup ---
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+# Buffer file writes: flush every 100 records, on WARNING and above, or at exit
+_file_handler = logging.FileHandler("chatbot.log")
+_file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+_buffered_file_handler = MemoryHandler(capacity=100, flushLevel=logging.WARNING, target=_file_handler)
+atexit.register(_buffered_file_handler.flush)
+
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
+    format=LOG_FORMAT,
     handlers=[
-        logging.FileHandler("chatbot.log"),
+        _buffered_file_handler,
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Precompiled patterns for the per-message hot path
+_SANITIZE_RE = re.compile(r'[^\w\s\?\.,-]')
+_NAME_RE = re.compile(r"Name: (.*)")
+_TOKEN_RE = re.compile(r"[\w-]+")
+# Every intent signal word in one alternation, so a query is scanned once for all of them.
+# All words match as substrings, like the original `in` checks and the sector scan in search_broad.
+_INTENT_RE = re.compile(r"these|they|fintech|logistics|best|top|good|suggest")
+FOLLOW_UP_INTENTS = frozenset({"these", "they"})
+AMBIGUOUS_INTENTS = frozenset({"best", "top", "good", "suggest"})
+# Sectors specific enough to answer an otherwise ambiguous "best"/"top" question
+SPECIFIC_INTENTS = frozenset({"fintech", "logistics"})
+
+# Query word -> canonical city, checked in priority order
+LOCATION_ALIASES = {
+    "bangalore": "bengaluru",
+    "bengaluru": "bengaluru",
+    "mumbai": "mumbai",
+    "delhi": "delhi_ncr",
+    "ncr": "delhi_ncr",
+}
+# Canonical city -> pattern over the lowercased location column
+LOCATION_RE = {
+    "bengaluru": re.compile("bengaluru"),
+    "mumbai": re.compile("mumbai"),
+    "delhi_ncr": re.compile("delhi|noida|gurugram"),
+}
+
+# One rendered row of format_results
+RESULT_TEMPLATE = (
+    "- Name: {}\n"
+    "  Description: {}\n"
+    "  Sector: {}\n"
+    "  Location: {}\n\n"
+)
+
+# Common words ignored by the keyword fallback to avoid matching everything
+STOP_WORDS = frozenset({"what", "does", "do", "tell", "me", "about", "is", "the", "a", "an"})
+
+# Bytes read up front to pick the CSV encoding before parsing
+ENCODING_SAMPLE_BYTES = 64 * 1024
+
+# Columns never displayed or searched, skipped at parse time
+DROPPED_COLUMNS = ("company_link",)
+
+# Arrow-backed strings give vectorized .str kernels; fall back to pandas' own string dtype
+STRING_DTYPE = "string[pyarrow]" if importlib.util.find_spec("pyarrow") else "string"
+
+# Low-cardinality columns stored as categoricals so equality/isin compare integer codes
+CATEGORICAL_COLUMNS = ("Company", "primary_sector", "location")
+
+# Final dtypes for the columns the bot reads, applied by read_csv itself
+PARSE_DTYPES = {
+    **{col: "category" for col in CATEGORICAL_COLUMNS},
+    "company_background": STRING_DTYPE,
+}
+
 # --- Observability / Metrics ---
 class MetricsTracker:
     def __init__(self):
@@ -26,7 +95,9 @@ class MetricsTracker:
             "errors": 0,
             "avg_latency_ms": 0.0
         }
-        self.latencies = []
+        # Running mean state, so no per-query latency history is kept
+        self._latency_count = 0
+        self._latency_avg = 0.0
 
     def log_query(self, latency_ms, is_clarification=False, is_error=False):
         self.metrics["total_queries"] += 1
@@ -35,9 +106,9 @@ class MetricsTracker:
         if is_error:
             self.metrics["errors"] += 1
         
-        self.latencies.append(latency_ms)
-        if self.latencies:
-            self.metrics["avg_latency_ms"] = sum(self.latencies) / len(self.latencies)
+        self._latency_count += 1
+        self._latency_avg += (latency_ms - self._latency_avg) / self._latency_count
+        self.metrics["avg_latency_ms"] = self._latency_avg
 
     def get_summary(self):
         return self.metrics
@@ -48,124 +119,210 @@ tracker = MetricsTracker()
 class DataEngine:
     def __init__(self, csv_path: str):
         self.df = self._load_data(csv_path)
+        # Lowercase the location column once so per-query filtering doesn't redo it
+        self._location_lower = self.df['location'].astype(STRING_DTYPE).str.lower().reset_index(drop=True)
+        # Flat lowercased row buffer + row start offsets for the keyword fallback in search_broad
+        self._row_text, self._row_offsets = self._build_row_buffer()
         # Create a lookup set for O(1) company name matching
         self.company_names = {name.lower(): name for name in self.df['Company'].unique()}
+        # Lowercased name -> row positions, so detail lookups skip the column scan
+        self._company_to_rows = {
+            name.lower(): rows
+            for name, rows in self.df.groupby('Company', sort=False, observed=True).indices.items()
+        }
+        # Lowercased names, longest first so e.g. "ola electric" wins over "ola" at the same position
+        self.company_names_lower = tuple(sorted(self.company_names, key=len, reverse=True))
+        # Single alternation over all names so a query is scanned once, not once per company
+        self._company_re = re.compile("|".join(map(re.escape, self.company_names_lower)))
         
+        # Static sector buckets, frozen so they are shared rather than rebuilt or mutated
         self.sectors_map = {
-            "fintech": [
+            "fintech": frozenset({
                 "Payments", "Alternative Lending", "Banking Tech", "Investment Tech", 
                 "Internet First Insurance Platforms", "Finance & Accounting Tech", "Cryptocurrencies"
-            ],
-            "logistics": ["Logistics Tech", "Road Transport Tech"],
-            "ecommerce": ["Horizontal E-Commerce", "B2B E-Commerce", "Auto E-Commerce & Content", "Online Grocery"],
-            "edtech": ["K-12 EdTech", "Test Preparation Tech", "Continued Learning"],
-            "health": ["Healthcare Booking Platforms", "Infectious Diseases", "Healthcare IT"]
+            }),
+            "logistics": frozenset({"Logistics Tech", "Road Transport Tech"}),
+            "ecommerce": frozenset({"Horizontal E-Commerce", "B2B E-Commerce", "Auto E-Commerce & Content", "Online Grocery"}),
+            "edtech": frozenset({"K-12 EdTech", "Test Preparation Tech", "Continued Learning"}),
+            "health": frozenset({"Healthcare Booking Platforms", "Infectious Diseases", "Healthcare IT"})
+        }
+        # Inverted index: sector keyword -> row positions of companies in that bucket
+        self._sector_index = {
+            key: np.flatnonzero(self.df['primary_sector'].isin(sectors).to_numpy())
+            for key, sectors in self.sectors_map.items()
         }
+        # One alternation over the sector keywords so a query is scanned once for all of them
+        self._sector_keys = tuple(self.sectors_map)
+        self._sector_re = re.compile("|".join(map(re.escape, self._sector_keys)))
+
+    def _detect_encoding(self, path: str) -> str:
+        """
+        Picks UTF-8 or Latin-1 from a sample of the file, so the CSV is parsed only once.
+        """
+        with open(path, 'rb') as f:
+            sample = f.read(ENCODING_SAMPLE_BYTES)
+        try:
+            # final=False tolerates a multi-byte character cut off at the sample boundary
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+            return 'utf-8'
+        except UnicodeDecodeError:
+            logger.warning("UTF-8 decode failed on sample. Using Latin-1...")
+            return 'latin1'
 
     def _load_data(self, path: str) -> pd.DataFrame:
         """
-        Loads CSV with encoding fallback (UTF-8 -> Latin-1).
+        Loads CSV with encoding detection (UTF-8 / Latin-1).
         """
+        encoding = self._detect_encoding(path)
+        # Parse the columns the bot reads straight into their final dtype
+        read_kwargs = {
+            "usecols": lambda col: col not in DROPPED_COLUMNS,
+            "dtype": PARSE_DTYPES,
+        }
         try:
-            df = pd.read_csv(path)
-            logger.info(f"Loaded {len(df)} records from {path} (UTF-8)")
+            df = pd.read_csv(path, encoding=encoding, **read_kwargs)
         except UnicodeDecodeError:
+            # Invalid UTF-8 past the sampled prefix
             logger.warning("UTF-8 decode failed. Retrying with Latin-1...")
+            encoding = 'latin1'
             try:
-                df = pd.read_csv(path, encoding='latin1')
-                logger.info(f"Loaded {len(df)} records from {path} (Latin-1)")
+                df = pd.read_csv(path, encoding=encoding, **read_kwargs)
             except Exception as e:
                 logger.error(f"Fallback loading failed: {e}")
                 raise e
+        logger.info(f"Loaded {len(df)} records from {path} ({encoding})")
 
         # Clean strings
-        obj_cols = df.select_dtypes(include=['object']).columns
+        obj_cols = df.select_dtypes(include=['object', 'string']).columns
         for col in obj_cols:
-            df[col] = df[col].str.strip()
+            stripped = df[col].str.strip()
+            df[col] = stripped if col in PARSE_DTYPES else stripped.astype(STRING_DTYPE)
+
+        # Categoricals only need their (few) labels stripped, unless stripping merges two of them
+        for col in CATEGORICAL_COLUMNS:
+            labels = df[col].cat.categories.str.strip()
+            if labels.is_unique:
+                df[col] = df[col].cat.rename_categories(labels)
+            else:
+                df[col] = df[col].astype(STRING_DTYPE).str.strip().astype('category')
         return df
 
+    def _build_row_buffer(self) -> Tuple[str, np.ndarray]:
+        """
+        Joins all rows into one lowercased string, returned with the start offset of
+        each row (plus a trailing end sentinel). Columns and rows are newline-separated
+        so a keyword can't match across either.
+        """
+        text = self.df.astype(str).fillna("")
+        row_strings = (
+            text.iloc[:, 0].str.cat([text[col] for col in text.columns[1:]], sep="\n")
+            .str.lower()
+        )
+        row_text = "".join(row + "\n" for row in row_strings)
+        row_offsets = np.concatenate(([0], np.cumsum(row_strings.str.len().to_numpy() + 1)))
+        return row_text, row_offsets
+
+    def match_company(self, lower_query: str) -> Optional[str]:
+        """Returns the lowercased name of the first company mentioned in the query, if any."""
+        match = self._company_re.search(lower_query)
+        return match.group(0) if match else None
+
     def get_company_details(self, company_name_lower: str) -> pd.DataFrame:
         """Direct lookup for a specific company."""
-        real_name = self.company_names.get(company_name_lower)
-        if real_name:
-            return self.df[self.df['Company'] == real_name]
-        return pd.DataFrame()
+        rows = self._company_to_rows.get(company_name_lower)
+        if rows is not None:
+            return self.df.take(rows)
+        return self.df.iloc[:0]
 
-    def filter_data(self, df_subset: pd.DataFrame, query: str) -> pd.DataFrame:
+    def filter_data(self, df_subset: pd.DataFrame, lower_query: str) -> pd.DataFrame:
         """
         Filters a given DataFrame based on query keywords (Location, Sector, etc).
-        Used for narrowing down context.
+        Used for narrowing down context. Expects an already lowercased query.
         """
-        query = query.lower()
-        results = df_subset.copy()
+        # Filters are AND-ed into one mask and applied once, so no copy of the subset is made
+        mask = np.ones(len(df_subset), dtype=bool)
+        # Row positions of the subset within self.df, to index the lowercased location cache
+        positions = self.df.index.get_indexer(df_subset.index)
 
         # 1. Location Filtering
-        if "bangalore" in query or "bengaluru" in query:
-            results = results[results['location'].str.contains("Bengaluru", case=False, na=False)]
-        elif "mumbai" in query:
-            results = results[results['location'].str.contains("Mumbai", case=False, na=False)]
-        elif "delhi" in query or "ncr" in query:
-            results = results[results['location'].str.contains("Delhi|Noida|Gurugram", case=False, na=False)]
+        # Substring match so "bangalore-based" or "delhincr" (sanitized "Delhi/NCR") still resolve
+        city = next((c for alias, c in LOCATION_ALIASES.items() if alias in lower_query), None)
+        if city:
+            location = self._location_lower.take(positions)
+            mask &= location.str.contains(LOCATION_RE[city], na=False).to_numpy(dtype=bool)
 
-        return results
+        return df_subset[mask]
 
-    def search_broad(self, query: str) -> pd.DataFrame:
+    def search_broad(self, lower_query: str, tokens: frozenset) -> pd.DataFrame:
         """
         Performs a broad search on the entire dataset using Sector mapping or Keywords.
+        `tokens` are the lowercased query words with STOP_WORDS already removed.
         """
-        query = query.lower()
-        results = self.df.copy()
-        
         # 1. Check Sector Mapping
-        sector_filter = []
-        for key, sectors in self.sectors_map.items():
-            if key in query:
-                sector_filter.extend(sectors)
+        hit_keys = dict.fromkeys(self._sector_re.findall(lower_query))
         
-        if sector_filter:
-            results = results[results['primary_sector'].isin(sector_filter)]
-            return results
+        if hit_keys:
+            idx = np.unique(np.concatenate([self._sector_index[key] for key in hit_keys]))
+            return self.df.take(idx)
 
         # 2. General Keyword Match if no sector found
-        # (Exclude common stop words to avoid matching everything)
-        stop_words = {"what", "does", "do", "tell", "me", "about", "is", "the", "a", "an"}
-        keywords = [w for w in query.split() if w not in stop_words]
-        
-        if keywords:
+        if tokens:
             # Match if ANY keyword exists in the string representation of the row
-            mask = results.apply(lambda x: x.astype(str).str.contains('|'.join(keywords), case=False, na=False)).any(axis=1)
-            results = results[mask]
+            pattern = re.compile('|'.join(map(re.escape, tokens)))
+            return self.df[self._rows_matching(pattern)]
         
-        return results
+        return self.df
+
+    def _rows_matching(self, pattern: re.Pattern) -> np.ndarray:
+        """
+        Boolean row mask for `pattern` over the flat row buffer. After each hit the
+        search resumes at the next row, so the regex engine does at most one scan of
+        the buffer and Python only runs once per matching row.
+        """
+        mask = np.zeros(len(self._row_offsets) - 1, dtype=bool)
+        pos = 0
+        while True:
+            match = pattern.search(self._row_text, pos)
+            if match is None:
+                return mask
+            row = int(np.searchsorted(self._row_offsets, match.start(), side='right')) - 1
+            mask[row] = True
+            pos = int(self._row_offsets[row + 1])
 
     def format_results(self, df: pd.DataFrame) -> str:
         if df.empty:
             return "No matching companies found."
         
-        # Limit to 5 for context window
-        top_results = df.head(5).to_dict(orient='records')
-        context_str = "Found the following companies:\n"
-        for res in top_results:
-            context_str += (
-                f"- Name: {res.get('Company')}\n"
-                f"  Description: {res.get('company_background')}\n"
-                f"  Sector: {res.get('primary_sector')}\n"
-                f"  Location: {res.get('location')}\n\n"
+        # Limit to 5 for context window, and only touch the columns that are rendered
+        top = df.head(5)
+        parts = ["Found the following companies:\n"]
+        parts.extend(
+            RESULT_TEMPLATE.format(*row)
+            for row in zip(
+                top['Company'].to_numpy(),
+                top['company_background'].to_numpy(),
+                top['primary_sector'].to_numpy(),
+                top['location'].to_numpy(),
             )
-        return context_str
+        )
+        return "".join(parts)
 
 # --- LLM Client ---
 class LLMClient:
     def __init__(self, api_key: str = None):
         self.api_key = api_key
 
-    def generate_response(self, system_prompt: str, user_query: str, context: str) -> str:
+    def generate_response(self, system_prompt: str, user_query: str, context: str,
+                          intents: Optional[frozenset] = None) -> str:
         # --- MOCK LLM LOGIC ---
         lower_query = user_query.lower()
+        # Callers that already scanned the query pass its intents in to skip a second scan
+        if intents is None:
+            intents = frozenset(_INTENT_RE.findall(lower_query))
         
         # 1. Ambiguity Check
-        if any(x in lower_query for x in ["best", "top", "good", "suggest"]):
-            if "fintech" not in lower_query and "logistics" not in lower_query:
+        if intents & AMBIGUOUS_INTENTS:
+            if not intents & SPECIFIC_INTENTS:
                 return "Could you verify which specific sector or criteria you are looking for? (e.g., Valuation, Sector, Location)"
 
         # 2. Contextual Response
@@ -175,7 +332,7 @@ class LLMClient:
         if "which of these" in lower_query:
             # The context string already contains the filtered list from Chatbot class
             # We just wrap it in natural language
-            companies = re.findall(r"Name: (.*)", context)
+            companies = _NAME_RE.findall(context)
             if companies:
                 return f"Based on your previous query, the companies matching your criteria are: {', '.join(companies)}."
             return "None of the previously listed companies match that criterion."
@@ -190,14 +347,17 @@ class Chatbot:
         self.history = [] 
         # State: Keep the actual DataFrame of the last result to filter "these"
         self.current_context_df: Optional[pd.DataFrame] = None 
+        # Last rendered context, keyed by the row labels format_results shows
+        self._fmt_cache: tuple = (None, "")
 
     def sanitize_input(self, user_input: str) -> str:
-        return re.sub(r'[^\w\s\?\.,-]', '', user_input).strip()
+        return _SANITIZE_RE.sub('', user_input).strip()
 
     def process_message(self, user_input: str) -> str:
         start_time = time.time()
         clean_input = self.sanitize_input(user_input)
         lower_input = clean_input.lower()
+        tokens = frozenset(_TOKEN_RE.findall(lower_input)) - STOP_WORDS
 
         response_df = pd.DataFrame()
         
@@ -205,13 +365,10 @@ class Chatbot:
         
         # A. Check for Company Name (Priority 1: Entity Search)
         # This fixes "What does Razorpay do?"
-        matched_company = None
-        for name in self.data_engine.company_names:
-            if name in lower_input:
-                matched_company = name
-                break
+        matched_company = self.data_engine.match_company(lower_input)
         
-        is_follow_up = "these" in lower_input or "they" in lower_input
+        intents = frozenset(_INTENT_RE.findall(lower_input))
+        is_follow_up = bool(intents & FOLLOW_UP_INTENTS)
 
         # --- Step 2: Data Retrieval ---
         
@@ -224,21 +381,27 @@ class Chatbot:
         elif is_follow_up and self.current_context_df is not None:
             # Contextual Filtering (Priority 2: Filter the *previous* results)
             # This fixes the "Bangalore" issue by only searching inside current_context_df
-            response_df = self.data_engine.filter_data(self.current_context_df, clean_input)
+            response_df = self.data_engine.filter_data(self.current_context_df, lower_input)
             # Do NOT overwrite current_context_df heavily, just refine it temporarily for display
             # Or strict narrowing:
             # self.current_context_df = response_df 
             
         else:
             # Broad Search (Priority 3: Keyword/Sector search)
-            response_df = self.data_engine.search_broad(clean_input)
+            response_df = self.data_engine.search_broad(lower_input, tokens)
             if not response_df.empty:
                 self.current_context_df = response_df
 
         # --- Step 3: Response Generation ---
         
-        context_str = self.data_engine.format_results(response_df)
-        response = self.llm.generate_response("", clean_input, context_str)
+        # Only the top 5 rows are rendered, so their labels identify the output
+        fmt_key = tuple(response_df.index[:5])
+        if fmt_key == self._fmt_cache[0]:
+            context_str = self._fmt_cache[1]
+        else:
+            context_str = self.data_engine.format_results(response_df)
+            self._fmt_cache = (fmt_key, context_str)
+        response = self.llm.generate_response("", clean_input, context_str, intents)
 
         # --- Step 4: Logging & Metrics ---
         latency = (time.time() - start_time) * 1000